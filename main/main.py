@@ -6,25 +6,21 @@ Created on Sun Apr 19 07:31:27 2020
 """
 
 # Standard Library Imports
-import warnings
-from sys import platform as _platform
+from sys import platform as _platform, stdout
+import logging
+from functools import lru_cache, partial
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
 
 
 # Third Party Imports
 import pandas as pd
-import numpy as np
 
 # Local application imports
 import utils
 # for some reason, 'from . import utils' doesn't work
 
 #%% Initialization
-# Filter Warnings
-warnings.filterwarnings("ignore")
-# ^ Doing this because the way I'm currently assigning values to dataframes
-# triggers a warning that I'm writing to an object reference, not a copy, which
-# is what I want to do
-
 # Platform dependent path
 if _platform == "darwin": # Mac
     root = "/Users/thomasj.king/Documents/Python_Scripts/shopping_list/"
@@ -35,58 +31,117 @@ else: # Windows
 table_path = root + "main/tables/"
 recipe_path = root + "main/recipes/"
 
-pantry = pd.read_csv(table_path + "pantry.csv")
-recipe_list = pd.read_csv(table_path + "recipe_list.csv")
-url_list = pd.read_csv(table_path + "url_list.txt")
-
-stopfoods = pd.read_csv(table_path + "stop_foods.txt")
-ingredients_lookup = pd.read_csv(table_path + "ingredients_lookup.csv")
-units_lookup = pd.read_csv(table_path + "units_lookup.csv")
-grocery_units = pd.read_csv(table_path + "grocery_units.csv")
-
-name_tables = [stopfoods,ingredients_lookup,units_lookup,grocery_units]
-
-default_cart = pd.read_pickle(table_path + "shopping_cart.pickle")
-
-v2v_table = pd.read_csv(table_path + "volume_to_volume.csv")
-m2m_table = pd.read_csv(table_path + "mass_to_mass.csv")
-v2m_table = pd.read_csv(table_path + "volume_to_mass.csv")
-m2v_table = pd.read_csv(table_path + "mass_to_volume.csv")
-conv_tables = [v2v_table,m2m_table,v2m_table,m2v_table]
+@lru_cache(maxsize=None)
+def loadTables():
+    r'''
+    Load all tables, once per session.
+    
+    Tables are only loaded the first time this is called, so importing this 
+    module doesn't do any file I/O. Tables are cached as pickles next to the 
+    csv files, and only re-parsed when the csv changes.
+
+    Returns
+    -------
+    types.SimpleNamespace
+        Loaded tables: pantry, recipe_list, url_list, recipe_tables, and 
+        default_cart.
+
+    '''
+    pantry = utils.cachedReadCsv(table_path + "pantry.csv")
+    recipe_list = utils.cachedReadCsv(table_path + "recipe_list.csv")
+    url_list = utils.cachedReadCsv(table_path + "url_list.txt")
+    
+    stopfoods = utils.cachedReadCsv(table_path + "stop_foods.txt")
+    ingredients_lookup = utils.cachedReadCsv(table_path + "ingredients_lookup.csv")
+    units_lookup = utils.cachedReadCsv(table_path + "units_lookup.csv")
+    grocery_units = utils.cachedReadCsv(table_path + "grocery_units.csv")
+    
+    # build the set and dict lookups once here, rather than rehashing the 
+    # tables for every recipe
+    stopfoods = frozenset(stopfoods.Name)
+    ingredients_map = utils.genericNameMap(ingredients_lookup)
+    units_map = utils.genericNameMap(units_lookup)
+    desired_units = utils.desiredUnitTable(grocery_units)
+    ingredient_names = utils.singularNames(ingredients_lookup)
+    
+    default_cart = pd.read_pickle(table_path + "shopping_cart.pickle")
+    
+    v2v_table = utils.cachedReadCsv(table_path + "volume_to_volume.csv")
+    m2m_table = utils.cachedReadCsv(table_path + "mass_to_mass.csv")
+    v2m_table = utils.cachedReadCsv(table_path + "volume_to_mass.csv")
+    m2v_table = utils.cachedReadCsv(table_path + "mass_to_volume.csv")
+    # flatten into conversion factor lookups once, so every recipe can be 
+    # converted in a single pass
+    conv_tables = utils.buildConversionTables(v2v_table,m2m_table,v2m_table,m2v_table)
+    
+    recipe_tables = utils.recipeTables(stopfoods=stopfoods,
+                                       ingredients_lookup=ingredients_lookup,
+                                       units_lookup=units_lookup,
+                                       desired_units=desired_units,
+                                       ingredients_map=ingredients_map,
+                                       units_map=units_map,
+                                       ingredient_names=ingredient_names,
+                                       conv_tables=conv_tables)
+    
+    return SimpleNamespace(pantry=pantry,recipe_list=recipe_list,
+                           url_list=url_list,recipe_tables=recipe_tables,
+                           default_cart=default_cart)
 
 # Flags
 verbose = True
 dbug = True
+# debugging messages are logged if dbug, informational ones if verbose
+log_level = logging.DEBUG if dbug else logging.INFO if verbose else logging.WARNING
+log = logging.getLogger(__name__)
 
 
 #%% Add stored recipes from csv files
-shopping_cart = utils.newCart(default_cart) # initialize Cart
-
-active_ix = np.flatnonzero(recipe_list.Select) # get active recipes
-# ^ np.argwhere does not work with numpy 1.18.1. Using flatnonzero instead
-
-# active_recipes = recipe_list.iloc[active_ix.flatten()] # this is needed for np.argwhere
-active_recipes = recipe_list.iloc[active_ix]
-
-for index,recipe in active_recipes.iterrows():
-    print("Adding " + recipe.Name + "...") if verbose else ...
-    ingredients = utils.loadAndFilterRecipe(recipe,recipe_path,name_tables,
-                                            conv_tables,verbose,dbug)
-    for index,ingredient in ingredients.iterrows():
-        # do comparison with existing list, then add to cart appropriately
-        shopping_cart.addToCart(ingredient)
+# each cell is guarded separately, so cells can still be run one at a time
+if __name__ == "__main__":
+    # only this script's and utils' messages follow the flags. Other 
+    # libraries (requests, urllib3, bs4) stay at the default WARNING level
+    logging.basicConfig(format="%(message)s",stream=stdout)
+    for logger in (log,logging.getLogger("utils")):
+        logger.setLevel(log_level)
+    tables = loadTables()
+    
+    shopping_cart = utils.newCart(tables.default_cart) # initialize Cart
+    
+    recipe_list = tables.recipe_list
+    active_recipes = recipe_list[recipe_list.Select.astype(bool)] # get active recipes
+    
+    # recipes are loaded in parallel, since loading is mostly waiting on disk
+    # or network. executor.map returns them in order, and the cart is only 
+    # touched from this thread
+    loadRecipe = partial(utils.loadAndFilterRecipe,recipe_path=recipe_path,
+                         tables=tables.recipe_tables)
+    
+    recipe_ingredients = []
+    recipes = list(active_recipes.itertuples(index=False))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for recipe,ingredients in zip(recipes,executor.map(loadRecipe,recipes)):
+            log.info("Adding %s...",recipe.Name)
+            recipe_ingredients.append(ingredients)
+    
+    # combine recipes and add to cart in one batch
+    if recipe_ingredients:
+        shopping_cart.addIngredients(pd.concat(recipe_ingredients,ignore_index=True))
 
 #%% Add new recipes from URLs
-for index,recipe in url_list.iterrows():
-    print("Adding " + recipe.Name + "...") if verbose else ...
-    ingredients = utils.loadAndFilterRecipe(recipe,recipe_path,name_tables,
-                                            conv_tables,verbose,dbug)
-    for index,ingredient in ingredients.iterrows():
-        # do comparison with existing list, then add to cart appropriately
-        shopping_cart.addToCart(ingredient)
+if __name__ == "__main__":
+    recipe_ingredients = []
+    recipes = list(tables.url_list.itertuples(index=False))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for recipe,ingredients in zip(recipes,executor.map(loadRecipe,recipes)):
+            log.info("Adding %s...",recipe.Name)
+            recipe_ingredients.append(ingredients)
+    
+    if recipe_ingredients:
+        shopping_cart.addIngredients(pd.concat(recipe_ingredients,ignore_index=True))
 
 #%% Print out list
-shopping_cart.sortAndPrint()
+if __name__ == "__main__":
+    shopping_cart.sortAndPrint()
 
 # print("Directions")
 # for i,j in enumerate(dirList): print(i+1,j)
\ No newline at end of file
@@ -9,54 +9,108 @@ Created on Wed Jun 17 18:58:54 2020
 
 """ Recipe Utilities"""
 
+import os
+import logging
+import pickle
+import threading
+from dataclasses import dataclass
 import pandas as pd
 import numpy as np
 import re
+from functools import lru_cache
 from fractions import Fraction
+from urllib.parse import urlparse
 import requests
-from bs4 import BeautifulSoup
-from textblob import TextBlob
+from bs4 import BeautifulSoup, SoupStrainer
 import inflection as inf
 
+log = logging.getLogger(__name__)
+
+@dataclass(frozen=True,slots=True)
+class recipeTables:
+    r'''
+    Lookup tables needed to load and filter a recipe.
+    
+    Built once per session and passed to loadAndFilterRecipe, so each table
+    is found by name instead of by its position in a list.
+
+    Attributes
+    ----------
+    stopfoods : set
+        Names of ingredients to leave out.
+    ingredients_lookup : pandas.core.frame.DataFrame
+        Ingredient names to generic names.
+    units_lookup : pandas.core.frame.DataFrame
+        Unit names to generic names.
+    desired_units : pandas.core.frame.DataFrame
+        Desired unit and category of each ingredient, as returned by 
+        desiredUnitTable.
+    ingredients_map : dict
+        ingredients_lookup as returned by genericNameMap.
+    units_map : dict
+        units_lookup as returned by genericNameMap.
+    ingredient_names : tuple
+        ingredients_lookup names as returned by singularNames.
+    conv_tables : tuple (2,)
+        Conversion factor lookups, as returned by buildConversionTables.
+
+    '''
+    stopfoods: frozenset
+    ingredients_lookup: pd.DataFrame
+    units_lookup: pd.DataFrame
+    desired_units: pd.DataFrame
+    ingredients_map: dict
+    units_map: dict
+    ingredient_names: tuple
+    conv_tables: tuple
+
 class newCart:
     def __init__(self, newCart):
+        # cart entries are kept in a dict keyed by (Name, Unit), so adding an
+        # ingredient is a single hashed lookup. self.list is only rebuilt from
+        # the entries when the cart is printed
         self.list = newCart
+        self.columns = list(newCart.columns)
+        self.items = {}
+        for item in newCart.to_dict(orient="records"):
+            self.items[(item["Name"],item["Unit"])] = item
         
     def addToCart(self,newIngredient):
-        # check if already in cart
-        nameIdx = self.list.Name == newIngredient.Name
-        if np.sum(nameIdx) == 1: # if == 1, then we have 1 match. 
-            if (self.list.Unit[nameIdx] == newIngredient.Unit).bool():
-                # ^ check for matching units
-                self.list.Amount[nameIdx] += newIngredient.Amount
-                self.list.Recipe[nameIdx] += ", " + newIngredient.Recipe
-            else: # otherwise add separate entry
-                self.list = self.list.append(newIngredient)
-        elif np.sum(nameIdx) > 1: # if multiple matches, then we have an ingredient
-            # with multiple entries due to differing units. 
-            unitIdx = self.list.Unit == newIngredient.Unit
-            matchingIdx = nameIdx & unitIdx
-            if np.any(matchingIdx): #Try to add together any entries with 
-                # matching units
-                if np.sum(matchingIdx) > 1: # we've really messed up
-                    raise ValueError("unexpected value for matchingIdx")
-                self.list.Amount[matchingIdx] += newIngredient.Amount
-                self.list.Recipe[matchingIdx] += ", " + newIngredient.Recipe
-            else: # otherwise add another entry
-                self.list = self.list.append(newIngredient)
+        # check if already in cart with matching units. The same ingredient 
+        # with differing units gets a separate entry
+        key = (newIngredient.Name,newIngredient.Unit)
+        item = self.items.get(key)
+        if item is None:
+            self.items[key] = {col: getattr(newIngredient,col) for col in self.columns}
         else:
-            self.list = self.list.append(newIngredient)
+            item["Amount"] += newIngredient.Amount
+            item["Recipe"] += ", " + newIngredient.Recipe
+    
+    def addIngredients(self,ingredients):
+        # combine matching ingredients across all recipes with one groupby,
+        # then add each combined entry to the cart. Groups keep the order 
+        # they first appear in, so recipes are listed in the order added
+        grouped = ingredients.groupby(["Name","Unit"],sort=False,dropna=False)
+        # an unknown (NaN) amount stays unknown, as when adding one at a time
+        amounts = grouped["Amount"].sum(min_count=1)
+        amounts = amounts.where(grouped["Amount"].count() == grouped.size())
+        combined = pd.DataFrame({"Amount":amounts,
+                                 "Recipe":grouped["Recipe"].agg(", ".join),
+                                 "Category":grouped["Category"].first()})
+        for ingredient in combined.reset_index().itertuples(index=False):
+            self.addToCart(ingredient)
     
     def returnIngredientAmount(self,ingredient_name):
-        this_ing = pd.DataFrame.squeeze(self.list[self.list.Name == ingredient_name])
-        print(this_ing.Amount,this_ing.Unit,"of",this_ing.Name)
+        for (name,unit),item in self.items.items():
+            if name == ingredient_name:
+                print(item["Amount"],unit,"of",name)
         
     def sortAndPrint(self):
-        # sort by name and then by category, so you have items listed 
-        # alphabetically within each category
-        self.list = self.list.sort_values(by=["Name"]) # sort by name
-        # self.list = self.list.sort_values(by=['Category']) # sort by category
-        self.list = self.list.reset_index(drop=True)
+        # sort by name in a single stable pass. Use by=["Category","Name"] to
+        # have items listed alphabetically within each category
+        self.list = pd.DataFrame(list(self.items.values()),columns=self.columns)
+        self.list = self.list.sort_values(by=["Name"],kind="mergesort",
+                                          ignore_index=True)
         self.list.to_csv("shopping_list.csv", index=False)
     def createDefaultCart(self,colList,fname):
         print("Saving new default cart as",fname)
@@ -65,23 +119,125 @@ class newCart:
 
             
 
-def convertGenericNames(ingredients,generic_names,attr):
+def cachedReadCsv(fpath):
+    r'''
+    Read csv file, using a pickled copy when it is up to date.
+    
+    This function reads fpath with pd.read_csv and pickles the result next to
+    it as fpath + ".pkl". Later calls read the pickle instead, which skips 
+    parsing the csv, until the csv is modified again. If the pickle can't be
+    read (e.g. written by another pandas version, or truncated) or written 
+    (e.g. read-only folder), the csv is used as if there were no cache.
+
+    Parameters
+    ----------
+    fpath : str
+        Location of csv file.
+
+    Returns
+    -------
+    pandas.core.frame.DataFrame
+        Contents of csv file.
+
+    '''
+    cache_path = fpath + ".pkl"
+    if (os.path.exists(cache_path) and 
+        os.path.getmtime(cache_path) >= os.path.getmtime(fpath)):
+        try:
+            return pd.read_pickle(cache_path)
+        except (OSError,EOFError,pickle.UnpicklingError,AttributeError,
+                ImportError,TypeError,ValueError):
+            pass # unreadable cache, so parse the csv again
+    table = pd.read_csv(fpath)
+    try:
+        table.to_pickle(cache_path)
+    except OSError:
+        pass # carry on without a cache
+    return table
+
+def genericNameMap(generic_names):
+    r'''
+    Build dict of known names to generic names.
+    
+    This function builds the lookup used by convertGenericNames once, so it 
+    doesn't need to be rebuilt for every recipe. Duplicate names keep their 
+    first generic name.
+
+    Parameters
+    ----------
+    generic_names : pandas.core.frame.DataFrame (m,2)
+        Lookup table matching m possible names to m generic names.
+
+    Returns
+    -------
+    dict
+        Maps generic_names.Name to generic_names.Generic.
+
+    '''
+    unique_names = generic_names.drop_duplicates("Name")
+    return dict(zip(unique_names["Name"],unique_names["Generic"]))
+
+def singularNames(generic_names):
+    r'''
+    Singularize the names of a generic names lookup table.
+    
+    This function builds the names matchIngredients scores against once, so
+    they don't need to be singularized again for every recipe.
+
+    Parameters
+    ----------
+    generic_names : pandas.core.frame.DataFrame (m,2)
+        Lookup table matching m possible names to m generic names.
+
+    Returns
+    -------
+    tuple (m,)
+        Singular form of each name in generic_names.Name.
+
+    '''
+    return tuple(singularize(name) for name in generic_names.Name)
+
+def desiredUnitTable(grocery_units):
+    r'''
+    Build table of desired unit and category for each ingredient.
+    
+    This function builds the lookup merged against every recipe in 
+    loadAndFilterRecipe once, so it doesn't need to be rebuilt for every 
+    recipe. Only the name, unit and category columns are kept, so any other 
+    columns added to grocery_units don't end up in the cart. Duplicate names 
+    keep their first entry.
+
+    Parameters
+    ----------
+    grocery_units : pandas.core.frame.DataFrame (m,)
+        Lookup table with columns {"Name","Unit","Category"}.
+
+    Returns
+    -------
+    pandas.core.frame.DataFrame (k,3)
+        One row per unique name with columns {"Name","DesUnit","Category"}.
+
+    '''
+    desired = grocery_units[["Name","Unit","Category"]].drop_duplicates("Name")
+    return desired.rename(columns={"Unit":"DesUnit"})
+
+def convertGenericNames(ingredients,generic_map,attr):
     r'''
     Convert known ingredient names to generic equivalents.
     
     This function converts known names to generic names by finding entries in 
-    ingredients.atrr that match exactly to the names in the generic_names.Name 
-    series. Conversion is done by locating index of the name in the series, and 
-    then replacing ingredient name with the value of generic_names.Generic at 
-    that index. This function is solely used when parsing recipes from
-    [root]/python/recipes/. 
+    ingredients.atrr that match exactly to the names in generic_map. 
+    Conversion is done by mapping each name through generic_map, and keeping
+    the original name where there is no match. This function is solely used
+    when parsing recipes from [root]/python/recipes/. 
 
     Parameters
     ----------
     ingredients : pandas.core.frame.DataFrame (n,3)
         DF of n ingredients to convert. Columns = {"Name","Amount","Unit"}
-    generic_names : pandas.core.frame.DataFrame (m,2)
-        Lookup table matching m possible names to m generic names.
+    generic_map : dict
+        Lookup of possible names to generic names, as returned by 
+        genericNameMap.
     attr : str
         Attribute to match (either "Name" or "Unit").
 
@@ -97,114 +253,111 @@ def convertGenericNames(ingredients,generic_names,attr):
     >>> units_lookup = pd.read_csv(table_path + "units_lookup.csv")
     >>> ingList,dirList = loadURL(recipe.Address)
     >>> ingredients = parseIngredients(ingList,ingredients_lookup,units_lookup)
-    >>> ingredients_generic = convertGenericNames(ingredients, ingredients_lookup, "Name")
+    >>> ingredients_map = genericNameMap(ingredients_lookup)
+    >>> convertGenericNames(ingredients, ingredients_map, "Name")
 
     '''
-    ing_list = ingredients[attr]
-    name_list = generic_names["Name"]
-    gen_list = generic_names["Generic"]
-    
-    # finding matching indices first prevents from having to loop through every
-    # ingredient and check it against the generic list - O(n) vs O(n^2)
-    idx = np.where(ing_list.isin(name_list))
-    if np.size(idx[0]): # if not empty (we have any matches)
-        for ix in idx[0]:
-            gen_ix = np.where(name_list.isin([ing_list.iloc[ix]]))
-            ing_list.iloc[ix] = gen_list.iloc[gen_ix[0][0]]
-            # ^ this is obviously hideous, must be better way to slice and assign.
-            # Doing above because np.where returns a tuple with an array inside, and if I 
-            # don't pass iloc an integer index, it won't assign correctly to just
-            # the variable in the series at that index
-
-def convertUnits(ingredient,toUnit,conv_tables,verbose=False):
+    # map every entry through the name -> generic dict in one pass. Entries 
+    # without a generic name map to NaN, so fall back to the original entry
+    ingredients[attr] = ingredients[attr].map(generic_map).fillna(ingredients[attr])
+
+def buildConversionTables(v2v_table,m2m_table,v2m_table,m2v_table):
     r'''
-    Convert between units of different types.
+    Build unit conversion factor lookups from the conversion tables.
     
-    This function takes in an ingredient, the desired unit, and converts 
-    between the current and desired unit using conv_tables. 
+    This function flattens the 4 conversion tables into 2 dicts of 
+    conversion factors keyed by unit tuples, so that a factor can be looked 
+    up directly by its units. Plain dicts are also safe to read from several
+    threads at once.
 
     Parameters
     ----------
-    ingredient : pandas.core.series.Series, (1,)
-        Single-element series which contains ingredient name, amount, unit, 
-        category, and recipe.
-    toUnit : str
-        Desired unit for conversion.
-    conv_tables : list (4,)
-        List containing tables for 4 different types of unit conversions:
-            v2v_table: pandas.core.frame.DataFrame
-                volume to volume conversions
-            m2m_table: pandas.core.frame.DataFrame
-                mass to mass conversions
-            v2m_table:pandas.core.frame.DataFrame
-                volume to mass conversions
-            m2v_table: pandas.core.frame.DataFrame
-                mass to volume conversions   
-    verbose : bool {True, False} , optional
-        Flag for informational print statements.
-
-    Raises
-    ------
-    KeyError
-        Raised if we have an ingredient listed in the special conversion table,
-        but the toUnit in the table doesn't match the toUnit passed into this
-        function. Does not raise KeyError otherwise.
+    v2v_table : pandas.core.frame.DataFrame
+        Volume to volume conversions. Columns = {"ToUnits",<volume units>}
+    m2m_table : pandas.core.frame.DataFrame
+        Mass to mass conversions. Columns = {"ToUnits",<mass units>}
+    v2m_table : pandas.core.frame.DataFrame
+        Ingredient specific volume to mass conversions. 
+        Columns = {"Name","ToUnits",<volume units>}
+    m2v_table : pandas.core.frame.DataFrame
+        Ingredient specific mass to volume conversions. 
+        Columns = {"Name","ToUnits",<mass units>}
 
     Returns
     -------
-    float
-        Converted ingredient amount.
+    unit_factors : dict
+        Mass to mass and volume to volume conversion factors, keyed by 
+        (Unit, ToUnits).
+    special_factors : dict
+        Volume to mass and mass to volume conversion factors, keyed by 
+        (Name, Unit, ToUnits).
     
     Example
     -------
     >>> import pandas as pd
-    >>> ingredient = pd.Series(["heavy whipping cream",0.5,"cups","dairy",
-                "Tikka Masala"],["Name","Amount","Unit","Category","Recipe"])
-    >>> toUnit = "fluid_oz"
     >>> v2v_table = pd.read_csv(table_path + "volume_to_volume.csv")
     >>> m2m_table = pd.read_csv(table_path + "mass_to_mass.csv")
     >>> v2m_table = pd.read_csv(table_path + "volume_to_mass.csv")
     >>> m2v_table = pd.read_csv(table_path + "mass_to_volume.csv")
-    >>> conv_tables = [v2v_table,m2m_table,v2m_table,m2v_table]
-    >>> new_amount = convertUnits(ingredient, toUnit, conv_tables)
+    >>> conv_tables = buildConversionTables(v2v_table,m2m_table,v2m_table,m2v_table)
 
     '''
-    # find what type of units we're converting between (mass or volume)
-    v2v_table,m2m_table,v2m_table,m2v_table = conv_tables # extract tables
-    
-    fromMass = np.any(m2m_table.ToUnits == ingredient.Unit)
-    fromVol = np.any(v2v_table.ToUnits == ingredient.Unit)
-    toMass = np.any(m2m_table.ToUnits == toUnit)
-    toVol = np.any(v2v_table.ToUnits == toUnit)
-    if fromMass and toMass: # convert between masses
-        conv_table = m2m_table
-    elif fromVol and toVol: # convert between volumes
-        conv_table = v2v_table
-    elif fromVol and toMass: # special convert from volume
-        if (v2m_table[v2m_table.Name == ingredient.Name].ToUnits == toUnit).bool():
-            print("Converting",ingredient.Name,"from",ingredient.Unit,"to",toUnit) if verbose else ...
-            return float(v2m_table[v2m_table.Name == ingredient.Name][ingredient.Unit])*ingredient.Amount
-        else:
-            # we have the ingredient listed in the special conversion table,
-            # but the toUnit in the table doesn't match the toUnit passed in to
-            # this function. Raise our own error because there is no KeyError otherwise
-            raise KeyError("unknown special unit conversion")
-    else: # special convert from mass
-        if (m2v_table[m2v_table.Name == ingredient.Name].ToUnits == toUnit).bool():
-            print("Converting",ingredient.Name,"from",ingredient.Unit,"to",toUnit) if verbose else ...
-            return float(m2v_table[m2v_table.Name == ingredient.Name][ingredient.Unit])*ingredient.Amount
-        else:
-            # we have the ingredient listed in the special conversion table,
-            # but the toUnit in the table doesn't match the toUnit passed in to
-            # this function. Raise our own error because there is no KeyError otherwise
-            raise KeyError("unknown special unit conversion")
+    # one row per (from unit, to unit) pair
+    unit_factors = pd.concat([table.melt(id_vars=["ToUnits"],var_name="Unit",
+                                         value_name="Factor")
+                              for table in [v2v_table,m2m_table]])
+    unit_factors = unit_factors.dropna().set_index(["Unit","ToUnits"])["Factor"]
+    # one row per (ingredient, from unit, to unit)
+    special_factors = pd.concat([table.melt(id_vars=["Name","ToUnits"],
+                                            var_name="Unit",value_name="Factor")
+                                 for table in [v2m_table,m2v_table]])
+    special_factors = special_factors.dropna().set_index(["Name","Unit","ToUnits"])["Factor"]
+    # keep the first entry for any repeated conversion
+    unit_factors = unit_factors[~unit_factors.index.duplicated()]
+    special_factors = special_factors[~special_factors.index.duplicated()]
+    return unit_factors.to_dict(),special_factors.to_dict()
+
+def conversionFactors(ingredients,toUnits,conv_tables):
+    r'''
+    Find conversion factors for many ingredients at once.
+    
+    Looks up the factor converting each ingredient's unit into the matching
+    entry of toUnits in the conversion lookups, preferring mass to mass and 
+    volume to volume factors over ingredient specific ones.
+
+    Parameters
+    ----------
+    ingredients : pandas.core.frame.DataFrame (n,)
+        Ingredients to convert. Needs columns {"Name","Amount","Unit"}
+    toUnits : pandas.core.series.Series (n,)
+        Desired unit for each ingredient.
+    conv_tables : tuple (2,)
+        Conversion factor lookups, as returned by buildConversionTables.
+
+    Returns
+    -------
+    pandas.core.series.Series (n,)
+        Conversion factor for each ingredient, with the same index as 
+        ingredients. NaN where no conversion is known.
+
+    '''
+    unit_factors,special_factors = conv_tables # extract lookups
+    
+    factors = np.array([unit_factors.get(key,np.nan) 
+                        for key in zip(ingredients.Unit,toUnits)],dtype=float)
+    special = np.array([special_factors.get(key,np.nan) 
+                        for key in zip(ingredients.Name,ingredients.Unit,toUnits)],
+                       dtype=float)
     
-    return float(conv_table[conv_table.ToUnits == toUnit][ingredient.Unit])*ingredient.Amount
-    # if the toUnit is a special unit that we haven't listed for this ingredient yet,
-    # then the above line will return a key error
+    isSpecial = np.isnan(factors) & ~np.isnan(special)
+    if log.isEnabledFor(logging.INFO):
+        for name,unit,toUnit in zip(ingredients.Name[isSpecial],
+                                    ingredients.Unit[isSpecial],toUnits[isSpecial]):
+            log.info("Converting %s from %s to %s",name,unit,toUnit)
+    return pd.Series(np.where(isSpecial,special,factors),index=ingredients.index)
 
 
-def loadAndFilterRecipe(recipe,recipe_path,name_tables,conv_tables,verbose=False,dbug=True):
+def loadAndFilterRecipe(recipe,recipe_path,tables):
     r'''
     Load and filter ingredients for given recipe.
     
@@ -214,18 +367,12 @@ def loadAndFilterRecipe(recipe,recipe_path,name_tables,conv_tables,verbose=False
 
     Parameters
     ----------
-    recipe : pandas.core.series.Series, (1,)
-        Single-element series containing recipe descriptors.
+    recipe : namedtuple or pandas.core.series.Series
+        Recipe descriptors, e.g. a row from DataFrame.itertuples.
     recipe_path : str
         Location of recipe files.
-    name_tables : list(4,)
-        List containing lookup tables for name removal and conversion.
-    conv_tables : list (4,)
-        List containing tables for 4 different types of unit conversions.
-    verbose : bool {True, False} , optional
-        Flag for informational print statements. The default is False.
-    dbug : bool {True, False} , optional
-        Flag for print statements related to debugging. The default is True.
+    tables : recipeTables
+        Lookup tables for name removal, categories and unit conversion.
 
     Returns
     -------
@@ -240,31 +387,40 @@ def loadAndFilterRecipe(recipe,recipe_path,name_tables,conv_tables,verbose=False
     >>> url_list = pd.read_csv(table_path + "url_list.txt")
     >>> recipe = url_list.iloc[0]
     >>> recipe_path = root + "python/recipes/"
-    >>> stopfoods = pd.read_csv(table_path + "stop_foods.txt")
+    >>> stopfoods = set(pd.read_csv(table_path + "stop_foods.txt").Name)
     >>> ingredients_lookup = pd.read_csv(table_path + "ingredients_lookup.csv")
     >>> units_lookup = pd.read_csv(table_path + "units_lookup.csv")
     >>> grocery_units = pd.read_csv(table_path + "grocery_units.csv")
-    >>> name_tables = [stopfoods,ingredients_lookup,units_lookup,grocery_units]
+    >>> ingredients_map = genericNameMap(ingredients_lookup)
+    >>> units_map = genericNameMap(units_lookup)
     >>> v2v_table = pd.read_csv(table_path + "volume_to_volume.csv")
     >>> m2m_table = pd.read_csv(table_path + "mass_to_mass.csv")
     >>> v2m_table = pd.read_csv(table_path + "volume_to_mass.csv")
     >>> m2v_table = pd.read_csv(table_path + "mass_to_volume.csv")
-    >>> conv_tables = [v2v_table,m2m_table,v2m_table,m2v_table]
-    >>> ingredients = loadAndFilterRecipe(recipe,recip_path,name_tables,conv_tables)
+    >>> conv_tables = buildConversionTables(v2v_table,m2m_table,v2m_table,m2v_table)
+    >>> desired_units = desiredUnitTable(grocery_units)
+    >>> ingredient_names = singularNames(ingredients_lookup)
+    >>> tables = recipeTables(stopfoods=stopfoods,
+                              ingredients_lookup=ingredients_lookup,
+                              units_lookup=units_lookup,
+                              desired_units=desired_units,
+                              ingredients_map=ingredients_map,
+                              units_map=units_map,
+                              ingredient_names=ingredient_names,
+                              conv_tables=conv_tables)
+    >>> ingredients = loadAndFilterRecipe(recipe,recip_path,tables)
 
     '''
     
     
-    # extract tables
-    stopfoods,ingredients_lookup,units_lookup,grocery_units = name_tables
-    
-    isURL = "Address" in recipe # boolean check on recipe type
+    isURL = hasattr(recipe,"Address") # boolean check on recipe type
     
     # load recipes
     if isURL:
         ingList,dirList = loadURL(recipe.Address)
-        print(ingList) if dbug else ...
-        ingredients = parseIngredients(ingList,ingredients_lookup,units_lookup)
+        log.debug("%s",ingList)
+        ingredients = parseIngredients(ingList,tables.ingredients_lookup,
+                                       tables.units_lookup,tables.ingredient_names)
     else:
         fpath = recipe_path + recipe.Name + ".csv"
         ingredients = pd.read_csv(fpath, dtype={'Amount':'float64'})
@@ -273,51 +429,57 @@ def loadAndFilterRecipe(recipe,recipe_path,name_tables,conv_tables,verbose=False
         # force lower case for comparisons later
         ingredients.Name = ingredients.Name.str.lower()
         # convert generic names
-        convertGenericNames(ingredients,ingredients_lookup,"Name")
+        convertGenericNames(ingredients,tables.ingredients_map,"Name")
         # convert generic units
-        convertGenericNames(ingredients,units_lookup,"Unit")
+        convertGenericNames(ingredients,tables.units_map,"Unit")
         
 
     ''' Filter '''
     
-    # add category column
-    ingredients["Category"] = np.nan 
     # remove stop foods
-    ingredients = ingredients.drop(ingredients[ingredients.Name.isin(stopfoods.Name)].index)
+    ingredients = ingredients[~ingredients.Name.isin(tables.stopfoods)]
     
-    for index,ing in ingredients.iterrows():
-        try:
-            # match ingredient to table
-            match = grocery_units[grocery_units.Name == ing.Name]
-            
-            # get desired unit
-            des_unit = match["Unit"].values[0]
-            
-            # assign category to ingredient
-            category = match["Category"].values[0]
-            ingredients.Category[index] = category
-            
-            if ing.Unit != des_unit:
-                try:
-                    ingredients.Amount[index] = convertUnits(ing,des_unit,conv_tables,verbose)
-                    ingredients.Unit[index] = des_unit
-                except:
-                    print(ing.Name,"needs special conversion") if dbug else ...
-        except:
-            print(ing.Name,"needs assigned category ----") if dbug else ...
+    # match every ingredient to the table at once, getting its desired unit 
+    # and category
+    ingredients = ingredients.merge(tables.desired_units,on="Name",how="left",
+                                    indicator=True)
+    matched = ingredients.pop("_merge") == "both"
+    for name in ingredients.Name[~matched]:
+        log.debug("%s needs assigned category ----",name)
+    
+    # convert any ingredients not already in their desired unit
+    needs_conv = matched & (ingredients.Unit != ingredients.DesUnit)
+    factors = conversionFactors(ingredients[needs_conv],ingredients.DesUnit[needs_conv],
+                                tables.conv_tables)
+    known = factors.notna()
+    converted = factors.index[known]
+    ingredients.loc[converted,"Amount"] *= factors[converted]
+    ingredients.loc[converted,"Unit"] = ingredients.DesUnit[converted]
+    for name in ingredients.Name[factors.index[~known]]:
+        log.debug("%s needs special conversion",name)
+    ingredients = ingredients.drop(columns="DesUnit")
             
     
     #Add recipe name
-    name_series = pd.Series(recipe.Name).repeat(len(ingredients))
-    name_series.name = "Recipe"
-    return pd.DataFrame.join(ingredients.reset_index(drop=True),name_series.reset_index(drop=True)) 
+    ingredients["Recipe"] = recipe.Name
+    return ingredients
+
+# decimals, or fractions written with a slash or fraction slash
+number_re = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?|[+-]?\d+[/\u2044]\d+")
+
+# words of an ingredient phrase. Words in the lookup tables are lower case 
+# letters and underscores (e.g. fluid_oz), so numbers and other punctuation 
+# are dropped
+word_re = re.compile(r"[a-z_]+")
 
 def myIsNumber(x):
     r'''
     Check if number, return float if so.
     
-    This function checks if input string is a number. Trys to convert to float,
-    or convert to fraction and then float. If unsuccessful, returns False.
+    This function checks if input string is a number. Strings that match 
+    number_re are converted to float, fractions through Fraction, so nothing
+    is raised for the many words that aren't numbers. If unsuccessful, 
+    returns False.
 
     Parameters
     ----------
@@ -330,28 +492,161 @@ def myIsNumber(x):
         Returns float if number is found. Otherwise, returns False.
 
     '''
-    # this is a goddamn mess and I don't care
+    if not number_re.fullmatch(x):
+        return False
+    if "/" not in x and chr(8260) not in x:
+        return float(x) # a decimal, too large ones are inf
     try:
-        return float(x)
-    except:
-        try:
-            return float(Fraction(x))
-        except:
-            try:
-                return float(Fraction(x.replace(chr(8260),"/")))
-            except:
-                return False
-
-def matchIngredient(ingName,genNames,dbug=True):
+        return float(Fraction(x.replace(chr(8260),"/")))
+    except (ZeroDivisionError,OverflowError):
+        return False
+
+@lru_cache(maxsize=8192)
+def singularize(word):
     r'''
-    Find matching ingredient name and return generic name.
+    Singularize a word, caching the result.
+    
+    inflection tries a long list of regexes on every call, and the same food
+    words and names come up in every recipe, so each word is only inflected
+    once per session.
+
+    Parameters
+    ----------
+    word : str
+        Word to singularize.
+
+    Returns
+    -------
+    str
+        Singular form of word.
+
+    '''
+    return inf.singularize(word)
+
+def scoreMatches(wordLists,names):
+    r'''
+    Score each list of words against each name in a list of names.
+    
+    This function counts, for every pair of word list and name, how many of 
+    the words appear in the name. Rather than comparing every word against 
+    every name, an inverted index from each word to the names containing it
+    is built once, so each word only touches the few names it can score for.
+
+    Parameters
+    ----------
+    wordLists : list (n,)
+        List of n word lists, one per ingredient phrase.
+    names : list (m,)
+        List of m names to score against. Words are split on whitespace.
+
+    Returns
+    -------
+    numpy.ndarray (n,m)
+        Score matrix, where score[i,j] is the number of words in wordLists[i]
+        that appear in names[j].
+
+    '''
+    # inverted index of word -> names containing that word
+    wordToNames = {}
+    for j,name in enumerate(names):
+        for word in set(name.split()):
+            wordToNames.setdefault(word,[]).append(j)
+    
+    score = np.zeros((len(wordLists),len(names)),dtype=int)
+    for i,words in enumerate(wordLists):
+        for word in words:
+            # words that aren't in any name can't score, so they're skipped
+            if word in wordToNames:
+                score[i,wordToNames[word]] += 1
+    return score
+
+def matchIngredients(ingNames,genNames,ingWords=None,singGenNames=None):
+    r'''
+    Find matching ingredient names and return generic names.
     
     This function uses the genName lookup table to find the matching ingredient
-    name in the genNames.Name series. Then returns the matching generic name. 
-    Finds matching ingredient by scoring names in series - 1 point for every
-    matching word. Then matching name is the one with the most points. If
-    multiple matches found, will return match name with shortest length (flour
-    matches equally to flour and flour tortillas, but the former is correct).
+    name in the genNames.Name series for each name in ingNames. Then returns 
+    the matching generic names. Finds matching ingredient by scoring names in 
+    series - 1 point for every matching word. Then matching name is the one 
+    with the most points. If multiple matches found, will return match name 
+    with shortest length (flour matches equally to flour and flour tortillas, 
+    but the former is correct). All ingredients are scored at once with 
+    scoreMatches, which only scores the names sharing a word with each 
+    ingredient.
+
+    Parameters
+    ----------
+    ingNames : list (n,)
+        List of n ingredient names.
+    genNames : pandas.core.frame.DataFrame (m,2)
+        Lookup table of m names and m corresponding generic names.
+    ingWords : list (n,), optional
+        Lower case words of each name in ingNames, if already tokenized by the
+        caller. The default is None, in which case ingNames are tokenized here.
+    singGenNames : tuple (m,), optional
+        genNames.Name as returned by singularNames, if already built by the 
+        caller. The default is None, in which case they are built here.
+
+    Returns
+    -------
+    list (n,)
+        Matching generic ingredient names. Ingredients without a single best
+        match keep their original name.
+
+    '''
+    
+    # get words from ingredient phrases
+    if ingWords is None:
+        ingWords = [word_re.findall(ingName.lower()) for ingName in ingNames]
+    # singularize using inflection
+    ingWords = [[singularize(word) for word in words] for words in ingWords]
+    if singGenNames is None:
+        singGenNames = singularNames(genNames)
+    # score each ingredient based on matching words with generic names
+    # here we're comparing whole words after we've singularized them
+    score = scoreMatches(ingWords,singGenNames)
+    # get max score for each ingredient
+    maxval = score.max(axis=1)
+    isMax = score == maxval[:,None]
+    numMax = isMax.sum(axis=1)
+    # if we have multiple maxima, we need to do some more calculations
+    # example: 'flour' matches 'flour' and 'flour tortilla' equally
+    # get character length of matching generic names, so the smallest matching
+    # name can be picked
+    counts = np.where(isMax,[len(name) for name in singGenNames],np.inf)
+    best = counts.argmin(axis=1)
+    numBest = np.sum(counts == counts.min(axis=1)[:,None],axis=1)
+    
+    matched = []
+    for i,ingName in enumerate(ingNames):
+        if maxval[i] == 0:
+            log.debug("%s has no matches",ingName)
+            matched.append(ingName)
+        elif numMax[i] > 1:
+            matchingNames = [singGenNames[j] for j in np.flatnonzero(isMax[i])]
+            log.debug("%s matches %s equally",ingName,matchingNames)
+            # if we have multiple matching names with equal length, then we 
+            # need to refine our generic names list
+            if numBest[i] > 1:
+                log.debug("could not find best match")
+                matched.append(ingName)
+            # otherwise, assume that smallest matching name is the one we want
+            else:
+                matchedIng = genNames.Generic.iloc[best[i]]
+                log.debug("%s matches best to %s",ingName,matchedIng)
+                matched.append(matchedIng)
+        # if 1 maximum, we've found the matching ingredient
+        else:
+            matchedIng = genNames.Generic.iloc[best[i]]
+            log.debug("%s matches to %s",ingName,matchedIng)
+            matched.append(matchedIng)
+    return matched
+
+def matchIngredient(ingName,genNames,ingWords=None,singGenNames=None):
+    r'''
+    Find matching ingredient name and return generic name.
+    
+    Single ingredient version of matchIngredients.
 
     Parameters
     ----------
@@ -359,8 +654,12 @@ def matchIngredient(ingName,genNames,dbug=True):
         Ingredient name.
     genNames : pandas.core.frame.DataFrame (n,2)
         Lookup table of n names and n corresponding generic names.
-    dbug : bool {True,False}, optional
-        Flag for print statements related to debugging. The default is True.
+    ingWords : list, optional
+        Lower case words of ingName, if already tokenized by the caller. The 
+        default is None, in which case ingName is tokenized here.
+    singGenNames : tuple (n,), optional
+        genNames.Name as returned by singularNames. The default is None, in 
+        which case they are built here.
 
     Returns
     -------
@@ -368,55 +667,62 @@ def matchIngredient(ingName,genNames,dbug=True):
         Matching generic ingredient name.
 
     '''
+    ingWords = None if ingWords is None else [ingWords]
+    return matchIngredients([ingName],genNames,ingWords,singGenNames)[0]
+
+def matchUnits(ingNames,genNames,ingWords=None):
+    r'''
+    Find matching unit names and return generic names.
+    
+    This function uses the genName lookup table to find the matching unit
+    name in the genNames.Name series for each name in ingNames. Then returns 
+    the matching generic names. Finds matching unit by scoring names in 
+    series - 1 point for every matching word. Then matching name is the one 
+    with the most points. If multiple matches found, will return match that 
+    occurs first in genNames. All ingredients are scored at once with 
+    scoreMatches.
+
+    Parameters
+    ----------
+    ingNames : list (n,)
+        List of n ingredient names.
+    genNames : pandas.core.frame.DataFrame (m,2)
+        Lookup table of m names and m corresponding generic names.
+    ingWords : list (n,), optional
+        Lower case words of each name in ingNames, if already tokenized by the
+        caller. The default is None, in which case ingNames are tokenized here.
+
+    Returns
+    -------
+    list (n,)
+        Matching generic unit names. Ingredients without any match get 
+        "units".
+
+    '''
+    # get words from ingredient phrases
+    if ingWords is None:
+        ingWords = [word_re.findall(ingName.lower()) for ingName in ingNames]
+    # score each word in ingredient name with generic units
+    score = scoreMatches(ingWords,list(genNames.Name))
+    # get max score. If 1 maxval, we found unit. If multiple maxvals, we assume
+    # first unit found is correct. argmax does the same either way
+    best = score.argmax(axis=1)
+    maxval = score.max(axis=1)
     
-    # get words from ingredient phrase
-    ingWords = TextBlob(ingName).words.lower()
-    # singularize using inflection (textblob is bad at this)
-    ingWords = [inf.singularize(word) for word in ingWords]
-    singGenNames = [inf.singularize(word) for word in genNames.Name]
-    # score each ingredient based on matching words with generic names
-    # here we're comparing whole words after we've singularized them
-    score = [len([None for ingWord in ingWords if ingWord in genName.split()]) for genName in singGenNames]
-    # get max score
-    maxval = max(score)
-    # if we have multiple maxima, we need to do some more calculations
-    # example: 'flour' matches 'flour' and 'flour tortilla' equally
-    if maxval == 0:
-        print(ingName,"has no matches") if dbug else ...
-        return ingName
-    elif score.count(maxval) > 1: 
-        # find indices of maxima
-        ix = [i for i,s in enumerate(score) if s == maxval]
-        # get character length of matching generic names
-        counts = [len(singGenNames[i]) for i in ix]
-        # if we have multiple matching names with equal length, then we need
-        # to refine our generic names list
-        matchingNames = [singGenNames[i] for i in ix]
-        print(ingName,"matches",matchingNames,"equally") if dbug else ...
-        if counts.count(min(counts)) > 1:
-            print("could not find best match") if dbug else ...
-            return ingName
-        # otherwise, assume that smallest matching name is the one we want
+    matched = []
+    for i,ingName in enumerate(ingNames):
+        if maxval[i] == 0:
+            log.debug("no units found for %s",ingName)
+            matched.append("units")
         else:
-            matchedIng = genNames.Generic[ix[counts.index(min(counts))]]
-            print(ingName,"matches best to",matchedIng) if dbug else ...
-            return matchedIng
-    # if 1 maximum, we've found the matching ingredient
-    else:
-        matchedIng = genNames.Generic[score.index(maxval)]
-        print(ingName,"matches to",matchedIng) if dbug else ...
-        return matchedIng
+            matched.append(genNames.Generic.iloc[best[i]])
+    return matched
 
-def matchUnit(ingName, genNames, dbug=True):
+def matchUnit(ingName, genNames, ingWords=None):
     r'''
     Find matching unit name and return generic name.
     
-    This function uses the genName lookup table to find the matching unit
-    name in the genNames.Name series. Then returns the matching generic name. 
-    Finds matching unit by scoring names in series - 1 point for every
-    matching word. Then matching name is the one with the most points. If
-    multiple matches found, will return match that occurs first in input 
-    ingName string.
+    Single ingredient version of matchUnits.
 
     Parameters
     ----------
@@ -424,8 +730,9 @@ def matchUnit(ingName, genNames, dbug=True):
         Ingredient name.
     genNames : pandas.core.frame.DataFrame (n,2)
         Lookup table of n names and n corresponding generic names.
-    dbug : bool {True,False}, optional
-        Flag for print statements related to debugging. The default is True.
+    ingWords : list, optional
+        Lower case words of ingName, if already tokenized by the caller. The 
+        default is None, in which case ingName is tokenized here.
 
     Returns
     -------
@@ -434,39 +741,29 @@ def matchUnit(ingName, genNames, dbug=True):
         
 
     '''
-    # get words from ingredient phrase
-    ingWords = TextBlob(ingName).words.lower()
-    # score each word in ingredient name with generic units
-    score = [len([None for ingWord in ingWords if ingWord in genName.split()]) for genName in genNames.Name]
-    # get max score
-    maxval = max(score)
-    
-    if maxval == 0:
-        print("no units found for",ingName) if dbug else ...
-        return "units"
-    else:
-        # if 1 maxval, we found unit. If multiple maxvals, we assume first
-        # unit found is correct. Operation is the same here either way
-        return genNames.Generic[score.index(maxval)]
+    ingWords = None if ingWords is None else [ingWords]
+    return matchUnits([ingName],genNames,ingWords)[0]
     
 
-def parseIngredients(ingList,ingredients_lookup,units_lookup,dbug=True):
+def parseIngredients(ingList,ingredients_lookup,units_lookup,ingredient_names=None):
     r'''
     Parse ingredients list into common names and units and output as DataFrame.
     
     This function parses the name string for each ingredient in ingList and
-    returns a DataFrame with the name, amount, and unit for each.
+    returns a DataFrame with the name, amount, and unit for each. Names and 
+    units are matched for the whole list at once.
 
     Parameters
     ----------
-    ingList : list (n,)
-        List of n ingredient strings.
+    ingList : list or tuple (n,)
+        Sequence of n ingredient strings.
     ingredients_lookup : pandas.core.frame.DataFrame (m,2)
         Lookup table of m ingredient names and n corresponding generic names.
     units_lookup : pandas.core.frame.DataFrame (k,2)
         Lookup table of k unit names and n corresponding generic names.
-    dbug : bool {True,False}, optional
-        Flag for print statements related to debugging. The default is True.
+    ingredient_names : tuple (m,), optional
+        ingredients_lookup names as returned by singularNames. The default is
+        None, in which case they are built here.
 
     Returns
     -------
@@ -474,79 +771,129 @@ def parseIngredients(ingList,ingredients_lookup,units_lookup,dbug=True):
         Ingredients DataFrame with columns: {"Name","Amount","Unit"}
 
     '''
-    newList = []
-    for ingName in ingList:
-        # remove parens
-        ingName = re.sub("[\(\[].*?[\)\]]","",ingName)
-        # get name
-        name = matchIngredient(ingName,ingredients_lookup,dbug)
-        # get amount
-        numbers = [myIsNumber(word) for word in ingName.split() if myIsNumber(word)]
-        amount = np.sum(numbers)
-        # get units
-        unit = matchUnit(ingName,units_lookup,dbug)
-        
-        newList.append([name,amount,unit])
-    return pd.DataFrame(newList,columns=["Name","Amount","Unit"])
+    # remove parens
+    ingNames = list(pd.Series(ingList,dtype=object).str.replace(
+        r"[\(\[].*?[\)\]]","",regex=True))
+    # tokenize once and share the words between name and unit matching
+    ingWords = [word_re.findall(ingName.lower()) for ingName in ingNames]
+    # get names
+    names = matchIngredients(ingNames,ingredients_lookup,ingWords,ingredient_names)
+    # get amounts, adding up every number in the phrase (e.g. "1 1/2")
+    amounts = [sum((number for word in ingName.split()
+                    if (number := myIsNumber(word))), 0.0)
+               for ingName in ingNames]
+    # get units
+    units = matchUnits(ingNames,units_lookup,ingWords)
+    
+    return pd.DataFrame({"Name":names,"Amount":amounts,"Unit":units})
 
+# one session per thread, so connections to a site are reused. Sessions 
+# aren't documented as thread safe, and recipes are loaded on a thread pool
+thread_sessions = threading.local()
+
+def getSession():
+    r'''
+    Returns the requests session of the calling thread.
+    
+    The session is created the first time a thread asks for it.
+
+    Returns
+    -------
+    requests.Session
+        Session for fetching recipe pages on this thread.
+
+    '''
+    if not hasattr(thread_sessions,"session"):
+        thread_sessions.session = requests.Session()
+    return thread_sessions.session
+
+# CSS selectors of the ingredient and direction sections on each supported 
+# site, and the tags of the items within them: (ingredients, directions, 
+# ingredient item, direction item)
+site_selectors = {
+    "food.com": ("div.recipe-layout__ingredients","div.recipe-layout__directions",
+                 "li","li"),
+    "bonappetit": ("div.ingredientsGroup","div.steps-wrapper","li","li"),
+    "allrecipes": ("fieldset.ingredients-section__fieldset",
+                   "fieldset.instructions-section__fieldset","li","li"),
+    "marthastewart": ("fieldset.ingredients-section__fieldset",
+                      "fieldset.instructions-section__fieldset","li","li"),
+    "foodnetwork": ("section.o-Ingredients","section.o-Method","p","li"),
+    "camelliabrand": ("div.ingredients","div.e-instructions.instructions","li","li"),
+    }
+# any other site is assumed to use the WordPress recipe maker plugin
+wordpress_selectors = ("div.wprm-recipe-ingredient-group",
+                       "div.wprm-recipe-instruction-group","li","li")
+
+# classes of all the sections above. Pages are only parsed inside elements 
+# with one of these classes
+recipe_classes = frozenset(cls
+    for selectors in [*site_selectors.values(),wordpress_selectors]
+    for selector in selectors[:2] for cls in selector.split(".")[1:])
+
+def isRecipeSection(classes):
+    r'''
+    Checks if an element is an ingredient or direction section.
+
+    Parameters
+    ----------
+    classes : str or None
+        Raw class attribute of the element, which may hold several classes.
+
+    Returns
+    -------
+    bool
+        True if any of the classes is in recipe_classes.
+
+    '''
+    return classes is not None and not recipe_classes.isdisjoint(classes.split())
+
+@lru_cache(maxsize=256)
 def loadURL(URL):
     r'''
     Loads recipe from URL.
     
     This function uses beautiful soup to read in URL content and then find 
     ingredients and directions lists based on specified format for each website.
+    The format is picked by the URL's host name from site_selectors.
+    Results are cached, so each URL is only downloaded and parsed once per 
+    session.
 
     Parameters
     ----------
     URL : str
         Recipe URL.
 
+    Raises
+    ------
+    ValueError
+        Raised if the ingredients or directions can't be found on the page.
+
     Returns
     -------
-    ingredients : list (n,)
-        List of n ingredient strings.
-    directions : list, (m,)
-        List of m directions strings.
+    ingredients : tuple (n,)
+        Tuple of n ingredient strings.
+    directions : tuple, (m,)
+        Tuple of m directions strings.
 
     '''
-    page = requests.get(URL)
-    soup = BeautifulSoup(page.content, 'html.parser')
-    isWordPress = soup.find("div", {"class": "wprm-recipe-ingredient-group"})
-    if isWordPress:
-        raw_ingredients = soup.find("div", {"class": "wprm-recipe-ingredient-group"})
-        raw_directions = soup.find("div", {"class": "wprm-recipe-instruction-group"})
-        ingTok = 'li'
-        dirTok = 'li'
-    if "food.com" in URL:
-        raw_directions = soup.find("div", {"class": "recipe-layout__directions"})
-        raw_ingredients = soup.find("div", {"class": "recipe-layout__ingredients"})
-        ingTok = 'li'
-        dirTok = 'li'
-    elif "bonappetit" in URL:
-        raw_ingredients = soup.find("div", {"class": "ingredientsGroup"})
-        raw_directions = soup.find("div", {"class": "steps-wrapper"})
-        ingTok = 'li'
-        dirTok = 'li'
-    elif "allrecipes" in URL or "marthastewart" in URL:
-        raw_ingredients = soup.find("fieldset", {"class": "ingredients-section__fieldset"})
-        raw_directions = soup.find("fieldset", {"class": "instructions-section__fieldset"})
-        ingTok = 'li'
-        dirTok = 'li'
-    elif "foodnetwork" in URL:
-        raw_ingredients = soup.find("section", {"class": "o-Ingredients"})
-        raw_directions = soup.find("section", {"class": "o-Method"})
-        ingTok = 'p'
-        dirTok= 'li'
-    elif "camelliabrand" in URL:
-        raw_ingredients = soup.find("div", {"class": "ingredients"})
-        raw_directions = soup.find("div", {"class": "e-instructions instructions"})
-        ingTok = 'li'
-        dirTok = 'li'
-    
-    ingredients = [x.get_text().strip()
-               for x in raw_ingredients.find_all(ingTok)]
-    directions = [x.get_text().strip()
-               for x in raw_directions.find_all(dirTok)]
+    page = getSession().get(URL)
+    soup = BeautifulSoup(page.content, 'lxml',
+                         parse_only=SoupStrainer(class_=isRecipeSection))
+    host = urlparse(URL).hostname or ""
+    ingSel,dirSel,ingTok,dirTok = next((selectors 
+        for site,selectors in site_selectors.items() if site in host),
+        wordpress_selectors)
+    raw_ingredients = soup.select_one(ingSel)
+    raw_directions = soup.select_one(dirSel)
+    if raw_ingredients is None or raw_directions is None:
+        raise ValueError("could not find recipe on " + URL)
+    
+    # tuples, so the cached results can't be changed by the caller
+    ingredients = tuple(x.get_text().strip()
+               for x in raw_ingredients.find_all(ingTok))
+    directions = tuple(x.get_text().strip()
+               for x in raw_directions.find_all(dirTok))
 
     return ingredients,directions
 
@@ -556,5 +903,5 @@ def loadURL(URL):
 # table_path = root + "python/tables/"
 # units_lookup = pd.read_csv(table_path + "units_lookup.csv")
 # matchUnit(ingName,units_lookup)
-URL = "https://www.camelliabrand.com/recipes/instant-pot-new-orleans-style-red-beans-and-rice/"
-loadURL(URL)
\ No newline at end of file
+# URL = "https://www.camelliabrand.com/recipes/instant-pot-new-orleans-style-red-beans-and-rice/"
+# loadURL(URL)
\ No newline at end of file